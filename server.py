@@ -2,10 +2,24 @@
 """OpenSky MCP Server - Real-time aircraft tracking and flight data"""
 
 import asyncio
-import aiohttp
-from datetime import datetime
+import functools
+import random
+import time
+import httpx
+import numpy as np
+from collections import namedtuple
 from typing import Any, Dict, List, Optional
 
+try:
+    import orjson
+except ImportError:
+    import json as orjson  # stdlib fallback; loads() accepts bytes too
+
+try:
+    import ijson
+except ImportError:
+    ijson = None  # optional; get_all_aircraft falls back to bulk parsing
+
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
@@ -16,47 +30,125 @@ OPENSKY_API_BASE = "https://opensky-network.org/api"
 
 server = Server("opensky-mcp")
 
-# Utility Functions
+# Shared HTTP client (keep-alive pool) - created lazily, closed in main().
+# HTTP/2 multiplexes concurrent requests (e.g. the gathered arrivals +
+# departures pair) over a single TLS connection.
+_session: Optional[httpx.AsyncClient] = None
+
+async def get_session() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use.
+
+    Reusing one client keeps the TLS connection to opensky-network.org
+    alive across tool calls instead of paying DNS+TCP+TLS setup each time.
+    """
+    global _session
+    if _session is None or _session.is_closed:
+        _session = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=32,
+                max_keepalive_connections=32,
+                keepalive_expiry=75,
+            ),
+            timeout=10.0,
+            headers={
+                # /states/all is highly compressible JSON (numbers and
+                # repeated nulls); gzip typically shrinks it 5-8x and
+                # httpx decompresses transparently
+                "Accept-Encoding": "gzip, deflate",
+            },
+        )
+    return _session
 
-async def fetch_json(session: aiohttp.ClientSession, url: str, params: Dict = None) -> Dict:
-    """Fetch JSON data from OpenSky API with error handling."""
-    try:
-        async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                return {"error": f"HTTP {response.status}: {response.reason}"}
-    except asyncio.TimeoutError:
-        return {"error": "Request timeout - OpenSky API took too long to respond"}
-    except aiohttp.ClientError as e:
-        return {"error": f"Network error: {str(e)}"}
-    except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}
+# Utility Functions
 
-def format_aircraft_state(state: List) -> Dict:
-    """Format raw OpenSky state vector into readable dict."""
+# Transient statuses worth retrying - OpenSky rate-limits anonymous
+# clients with 429 and intermittently returns gateway errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 4
+
+async def fetch_json(session: httpx.AsyncClient, url: str, params: Dict = None) -> Dict:
+    """Fetch JSON data from OpenSky API with error handling.
+
+    Rate limiting, gateway errors, and timeouts are retried with
+    exponential backoff plus jitter (honoring Retry-After when sent)
+    before giving up with an error dict.
+    """
+    error = "Request failed"
+    for attempt in range(MAX_ATTEMPTS):
+        delay = 0.0
+        try:
+            response = await session.get(url, params=params)
+            if response.status_code == 200:
+                # Feed raw bytes straight to orjson - skips charset
+                # sniffing and is much faster on multi-MB payloads
+                return orjson.loads(response.content)
+            error = f"HTTP {response.status_code}: {response.reason_phrase}"
+            if response.status_code not in RETRYABLE_STATUS:
+                return {"error": error}
+            try:
+                delay = float(response.headers.get("Retry-After", 0))
+            except ValueError:
+                delay = 0.0
+        except httpx.TimeoutException:
+            error = "Request timeout - OpenSky API took too long to respond"
+        except httpx.HTTPError as e:
+            return {"error": f"Network error: {str(e)}"}
+        except Exception as e:
+            return {"error": f"Unexpected error: {str(e)}"}
+
+        if attempt < MAX_ATTEMPTS - 1:
+            backoff = min(8.0, 0.25 * 2 ** attempt)
+            await asyncio.sleep((delay or backoff) + random.random() * 0.1)
+
+    return {"error": error}
+
+# Short-lived response cache for /states/all. OpenSky refreshes state
+# vectors on a ~10 s cadence for anonymous users, so repeat queries inside
+# that window would re-download identical data.
+_cache: Dict[tuple, tuple] = {}
+_cache_locks: Dict[tuple, asyncio.Lock] = {}
+
+async def cached_fetch_json(session: httpx.AsyncClient, url: str,
+                            params: Dict = None, ttl: float = 8.0) -> Dict:
+    """Fetch JSON with a short TTL cache keyed by (url, params).
+
+    A per-key lock coalesces concurrent requests for the same data into a
+    single HTTP round trip (single-flight). Error responses are not cached.
+    """
+    key = (url, tuple(sorted((params or {}).items())))
+    lock = _cache_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cached = _cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        data = await fetch_json(session, url, params)
+        if not (isinstance(data, dict) and "error" in data):
+            _cache[key] = (time.monotonic(), data)
+        return data
+
+# OpenSky state vector fields, in API order (altitudes in meters,
+# velocity/vertical_rate in m/s, true_track in degrees)
+AircraftState = namedtuple("AircraftState", [
+    "icao24", "callsign", "origin_country", "time_position", "last_contact",
+    "longitude", "latitude", "baro_altitude", "on_ground", "velocity",
+    "true_track", "vertical_rate", "sensors", "geo_altitude", "squawk",
+    "spi", "position_source"
+])
+
+def format_aircraft_state(state: List) -> Optional[AircraftState]:
+    """Wrap a raw OpenSky state vector in an AircraftState.
+
+    One C-level slice + _make instead of 17 individual index/key
+    assignments - this runs once per aircraft in the listing loops.
+    """
     if not state or len(state) < 17:
-        return {}
-
-    return {
-        "icao24": state[0],  # Unique ICAO 24-bit address
-        "callsign": state[1].strip() if state[1] else "N/A",
-        "origin_country": state[2],
-        "time_position": state[3],
-        "last_contact": state[4],
-        "longitude": state[5],
-        "latitude": state[6],
-        "baro_altitude": state[7],  # meters
-        "on_ground": state[8],
-        "velocity": state[9],  # m/s
-        "true_track": state[10],  # degrees
-        "vertical_rate": state[11],  # m/s
-        "sensors": state[12],
-        "geo_altitude": state[13],  # meters
-        "squawk": state[14],
-        "spi": state[15],
-        "position_source": state[16]
-    }
+        return None
+
+    # Normalize the callsign once here; OpenSky pads it with trailing
+    # spaces and call sites previously each re-stripped it
+    return AircraftState._make((state[0], (state[1] or "").strip() or "N/A",
+                                *state[2:17]))
 
 def meters_to_feet(meters: float) -> float:
     """Convert meters to feet."""
@@ -66,397 +158,653 @@ def mps_to_knots(mps: float) -> float:
     """Convert m/s to knots."""
     return mps * 1.94384 if mps else 0
 
+# Flights in the same window cluster into the same minute buckets, so a
+# small LRU on the formatters gets a high hit rate across a response
+@functools.lru_cache(maxsize=1024)
+def _fmt_hm(ts: float) -> str:
+    """Format a Unix timestamp as 'HH:MM UTC' without building a datetime."""
+    t = time.gmtime(ts)
+    return f"{t.tm_hour:02d}:{t.tm_min:02d} UTC"
+
+@functools.lru_cache(maxsize=1024)
+def _fmt_ymdhm(ts: float) -> str:
+    """Format a Unix timestamp as 'YYYY-MM-DD HH:MM UTC'."""
+    t = time.gmtime(ts)
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} {t.tm_hour:02d}:{t.tm_min:02d} UTC"
+
+@functools.lru_cache(maxsize=1024)
+def _fmt_ymdhms(ts: float) -> str:
+    """Format a Unix timestamp as 'YYYY-MM-DD HH:MM:SS UTC'."""
+    t = time.gmtime(ts)
+    return (f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} "
+            f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d} UTC")
+
+def state_numeric_columns(states: List) -> np.ndarray:
+    """Stack lon/lat/baro_altitude/velocity of raw state vectors into a
+    float64 array (None becomes NaN) so unit conversions run as single
+    vector multiplies instead of per-row Python calls."""
+    return np.array(
+        [[s[5], s[6], s[7], s[9]] for s in states], dtype=np.float64
+    ).reshape(-1, 4)
+
+def _present(col: np.ndarray) -> np.ndarray:
+    """Mask of entries that carry a real value (None and 0 both mean the
+    field was not reported, matching the old truthiness checks)."""
+    return ~np.isnan(col) & (col != 0)
+
+class _AiterReader:
+    """Minimal async file-like over an async byte iterator.
+
+    ijson wants an object with an async read(n); httpx only exposes
+    chunk iteration, so adapt one to the other. Chunk sizes need not
+    match n - ijson buffers whatever it receives.
+    """
+
+    def __init__(self, aiter):
+        self._aiter = aiter
+
+    async def read(self, n: int) -> bytes:
+        if n == 0:
+            return b""
+        try:
+            return await self._aiter.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+async def _stream_states(session: httpx.AsyncClient, url: str, limit: int) -> Any:
+    """Stream the first `limit` state vectors of a /states/all response.
+
+    ijson pulls rows out of the 'states' array as bytes arrive from the
+    socket, so the full multi-MB payload is never materialized and we
+    stop reading once enough rows are collected. Returns a list of raw
+    state vectors, or an error dict shaped like fetch_json's.
+    """
+    try:
+        async with session.stream("GET", url) as response:
+            if response.status_code != 200:
+                return {"error": f"HTTP {response.status_code}: {response.reason_phrase}"}
+
+            rows = []
+            reader = _AiterReader(response.aiter_bytes())
+            async for row in ijson.items(reader, "states.item"):
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+            return rows
+    except httpx.TimeoutException:
+        return {"error": "Request timeout - OpenSky API took too long to respond"}
+    except httpx.HTTPError as e:
+        return {"error": f"Network error: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
+async def _fetch_flights(session: httpx.AsyncClient, kind: str,
+                         icao: str, begin: float, end: float) -> Any:
+    """Fetch /flights/arrival or /flights/departure for one airport."""
+    url = f"{OPENSKY_API_BASE}/flights/{kind}"
+    params = {
+        "airport": icao,
+        "begin": int(begin),
+        "end": int(end)
+    }
+    return await fetch_json(session, url, params)
+
+def _append_time_window(parts: List[str], begin: float, end: float) -> None:
+    """Append the time-window header shared by the flight tools."""
+    parts.append(f"**Time Window:**\n")
+    parts.append(f"- {_fmt_ymdhm(begin)} to ")
+    parts.append(f"{_fmt_hm(end)}\n\n")
+
+def _append_flight_lines(parts: List[str], flights: List[Dict],
+                         route_key: str, route_label: str) -> None:
+    """Append per-flight Markdown lines shared by the flight tools.
+
+    route_key/route_label pick the counterpart airport field, e.g.
+    ('estDepartureAirport', 'From') for arrivals.
+    """
+    append = parts.append
+    for flight in flights[:30]:  # Limit to 30
+        # Bind .get once and pull every field up front - local loads
+        # instead of repeated attribute+hash lookups in the loop body
+        _get = flight.get
+        cs = (_get('callsign') or 'N/A').strip() or 'N/A'
+        icao24 = _get('icao24', 'N/A')
+        route = _get(route_key)
+        first_seen = _get('firstSeen')
+        last_seen = _get('lastSeen')
+
+        append(f"**{cs}**\n")
+        append(f"- ICAO24: {icao24}\n")
+
+        if route:
+            append(f"- {route_label}: {route}\n")
+
+        if first_seen:
+            append(f"- First Seen: {_fmt_hm(first_seen)}\n")
+
+        if last_seen:
+            append(f"- Last Seen: {_fmt_hm(last_seen)}\n")
+
+        append("\n")
+
+    if len(flights) > 30:
+        parts.append(f"*Showing 30 of {len(flights)} flights*\n")
+
 # MCP Tools
 
-@server.list_tools()
-async def handle_list_tools() -> list[types.Tool]:
-    """List all available OpenSky tools."""
-    return [
-        types.Tool(
-            name="get_aircraft_in_region",
-            description="Get all aircraft currently in a geographic bounding box",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "lat_min": {
-                        "type": "number",
-                        "description": "Minimum latitude (e.g., 38.8 for Northern Virginia)"
-                    },
-                    "lat_max": {
-                        "type": "number",
-                        "description": "Maximum latitude (e.g., 39.0)"
-                    },
-                    "lon_min": {
-                        "type": "number",
-                        "description": "Minimum longitude (e.g., -77.5 for DC area)"
-                    },
-                    "lon_max": {
-                        "type": "number",
-                        "description": "Maximum longitude (e.g., -77.0)"
-                    }
+# Tool definitions are constants - build the Tool models and their
+# schema dicts once at import instead of on every list_tools call
+_TOOLS_CACHE: list[types.Tool] = [
+    types.Tool(
+        name="get_aircraft_in_region",
+        description="Get all aircraft currently in a geographic bounding box",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "lat_min": {
+                    "type": "number",
+                    "description": "Minimum latitude (e.g., 38.8 for Northern Virginia)"
                 },
-                "required": ["lat_min", "lat_max", "lon_min", "lon_max"]
-            }
-        ),
-        types.Tool(
-            name="get_aircraft_by_callsign",
-            description="Track a specific aircraft by callsign (e.g., UAL123, AAL456)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "callsign": {
-                        "type": "string",
-                        "description": "Aircraft callsign (e.g., UAL123)"
-                    }
+                "lat_max": {
+                    "type": "number",
+                    "description": "Maximum latitude (e.g., 39.0)"
+                },
+                "lon_min": {
+                    "type": "number",
+                    "description": "Minimum longitude (e.g., -77.5 for DC area)"
+                },
+                "lon_max": {
+                    "type": "number",
+                    "description": "Maximum longitude (e.g., -77.0)"
+                }
+            },
+            "required": ["lat_min", "lat_max", "lon_min", "lon_max"]
+        }
+    ),
+    types.Tool(
+        name="get_aircraft_by_callsign",
+        description="Track specific aircraft by callsign (e.g., UAL123, AAL456). Accepts a single callsign or a list.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "callsign": {
+                    "type": "string",
+                    "description": "Aircraft callsign (e.g., UAL123). Provide this or 'callsigns'."
                 },
-                "required": ["callsign"]
+                "callsigns": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Multiple callsigns to look up in one pass (e.g., [\"UAL123\", \"AAL456\"])"
+                }
             }
-        ),
-        types.Tool(
-            name="get_all_aircraft",
-            description="Get all aircraft currently tracked by OpenSky Network (WARNING: Large dataset)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "limit": {
-                        "type": "number",
-                        "description": "Limit number of results (default: 50)"
-                    }
+        }
+    ),
+    types.Tool(
+        name="get_all_aircraft",
+        description="Get all aircraft currently tracked by OpenSky Network (WARNING: Large dataset)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "limit": {
+                    "type": "number",
+                    "description": "Limit number of results (default: 50)"
                 }
             }
-        ),
-        types.Tool(
-            name="get_arrivals",
-            description="Get flights arriving at an airport in a time window",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "icao": {
-                        "type": "string",
-                        "description": "Airport ICAO code (e.g., KDCA for Reagan National)"
-                    },
-                    "begin": {
-                        "type": "number",
-                        "description": "Begin time as Unix timestamp (seconds since epoch)"
-                    },
-                    "end": {
-                        "type": "number",
-                        "description": "End time as Unix timestamp (seconds since epoch)"
-                    }
+        }
+    ),
+    types.Tool(
+        name="get_arrivals",
+        description="Get flights arriving at an airport in a time window",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "icao": {
+                    "type": "string",
+                    "description": "Airport ICAO code (e.g., KDCA for Reagan National)"
                 },
-                "required": ["icao", "begin", "end"]
-            }
-        ),
-        types.Tool(
-            name="get_departures",
-            description="Get flights departing from an airport in a time window",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "icao": {
-                        "type": "string",
-                        "description": "Airport ICAO code (e.g., KIAD for Dulles)"
-                    },
-                    "begin": {
-                        "type": "number",
-                        "description": "Begin time as Unix timestamp (seconds since epoch)"
-                    },
-                    "end": {
-                        "type": "number",
-                        "description": "End time as Unix timestamp (seconds since epoch)"
-                    }
+                "begin": {
+                    "type": "number",
+                    "description": "Begin time as Unix timestamp (seconds since epoch)"
                 },
-                "required": ["icao", "begin", "end"]
-            }
-        )
-    ]
+                "end": {
+                    "type": "number",
+                    "description": "End time as Unix timestamp (seconds since epoch)"
+                }
+            },
+            "required": ["icao", "begin", "end"]
+        }
+    ),
+    types.Tool(
+        name="get_departures",
+        description="Get flights departing from an airport in a time window",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "icao": {
+                    "type": "string",
+                    "description": "Airport ICAO code (e.g., KIAD for Dulles)"
+                },
+                "begin": {
+                    "type": "number",
+                    "description": "Begin time as Unix timestamp (seconds since epoch)"
+                },
+                "end": {
+                    "type": "number",
+                    "description": "End time as Unix timestamp (seconds since epoch)"
+                }
+            },
+            "required": ["icao", "begin", "end"]
+        }
+    ),
+    types.Tool(
+        name="get_airport_activity",
+        description="Get arrivals and departures for an airport in one call (both fetched concurrently)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "icao": {
+                    "type": "string",
+                    "description": "Airport ICAO code (e.g., KDCA for Reagan National)"
+                },
+                "begin": {
+                    "type": "number",
+                    "description": "Begin time as Unix timestamp (seconds since epoch)"
+                },
+                "end": {
+                    "type": "number",
+                    "description": "End time as Unix timestamp (seconds since epoch)"
+                }
+            },
+            "required": ["icao", "begin", "end"]
+        }
+    )
+]
 
-@server.call_tool()
-async def handle_call_tool(
-    name: str, arguments: dict | None
-) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
-    """Handle tool execution."""
-
-    if name == "get_aircraft_in_region":
-        lat_min = arguments.get("lat_min")
-        lat_max = arguments.get("lat_max")
-        lon_min = arguments.get("lon_min")
-        lon_max = arguments.get("lon_max")
-
-        async with aiohttp.ClientSession() as session:
-            url = f"{OPENSKY_API_BASE}/states/all"
-            params = {
-                "lamin": lat_min,
-                "lamax": lat_max,
-                "lomin": lon_min,
-                "lomax": lon_max
-            }
+@server.list_tools()
+async def handle_list_tools() -> list[types.Tool]:
+    """List all available OpenSky tools."""
+    return _TOOLS_CACHE
+
+def with_error_handling(handler):
+    """Wrap a tool handler so unexpected exceptions become an error reply
+    instead of crashing the MCP request."""
+    @functools.wraps(handler)
+    async def wrapper(session: httpx.AsyncClient, args: Dict):
+        try:
+            return await handler(session, args)
+        except Exception as e:
+            return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+    return wrapper
+
+@with_error_handling
+async def _tool_aircraft_in_region(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_aircraft_in_region."""
+    lat_min = args.get("lat_min")
+    lat_max = args.get("lat_max")
+    lon_min = args.get("lon_min")
+    lon_max = args.get("lon_max")
+
+    url = f"{OPENSKY_API_BASE}/states/all"
+    params = {
+        "lamin": lat_min,
+        "lamax": lat_max,
+        "lomin": lon_min,
+        "lomax": lon_max
+    }
 
-            data = await fetch_json(session, url, params)
+    data = await cached_fetch_json(session, url, params)
 
-            if "error" in data:
-                return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+    if "error" in data:
+        return [types.TextContent(type="text", text=f"Error: {data['error']}")]
 
-            states = data.get("states", [])
+    states = data.get("states", [])
 
-            if not states:
-                return [types.TextContent(
-                    type="text",
-                    text=f"No aircraft found in region:\n"
-                         f"- Lat: {lat_min} to {lat_max}\n"
-                         f"- Lon: {lon_min} to {lon_max}"
-                )]
+    if not states:
+        return [types.TextContent(
+            type="text",
+            text=f"No aircraft found in region:\n"
+                 f"- Lat: {lat_min} to {lat_max}\n"
+                 f"- Lon: {lon_min} to {lon_max}"
+        )]
 
-            result = f"**Aircraft in Region** (Found: {len(states)})\n\n"
-            result += f"**Bounding Box:**\n"
-            result += f"- Latitude: {lat_min} to {lat_max}\n"
-            result += f"- Longitude: {lon_min} to {lon_max}\n\n"
+    parts = [f"**Aircraft in Region** (Found: {len(states)})\n\n"]
+    parts.append(f"**Bounding Box:**\n")
+    parts.append(f"- Latitude: {lat_min} to {lat_max}\n")
+    parts.append(f"- Longitude: {lon_min} to {lon_max}\n\n")
 
-            for state in states[:50]:  # Limit to 50 for readability
-                aircraft = format_aircraft_state(state)
+    shown = states[:50]  # Limit to 50 for readability
+    lon, lat, alt_m, vel = state_numeric_columns(shown).T
+    alt_ft = alt_m * 3.28084
+    spd_kt = vel * 1.94384
+    has_pos = _present(lat) & _present(lon)
+    has_alt = _present(alt_ft)
+    has_spd = _present(spd_kt)
 
-                result += f"**{aircraft['callsign']}** ({aircraft['origin_country']})\n"
-                result += f"- ICAO24: {aircraft['icao24']}\n"
+    append = parts.append
+    for i, state in enumerate(shown):
+        aircraft = format_aircraft_state(state)
 
-                if aircraft['latitude'] and aircraft['longitude']:
-                    result += f"- Position: {aircraft['latitude']:.4f}, {aircraft['longitude']:.4f}\n"
+        append(f"**{aircraft.callsign}** ({aircraft.origin_country})\n")
+        append(f"- ICAO24: {aircraft.icao24}\n")
 
-                if aircraft['baro_altitude']:
-                    result += f"- Altitude: {meters_to_feet(aircraft['baro_altitude']):,.0f} ft\n"
+        if has_pos[i]:
+            append(f"- Position: {lat[i]:.4f}, {lon[i]:.4f}\n")
 
-                if aircraft['velocity']:
-                    result += f"- Speed: {mps_to_knots(aircraft['velocity']):.0f} knots\n"
+        if has_alt[i]:
+            append(f"- Altitude: {int(round(alt_ft[i])):,} ft\n")
 
-                if aircraft['on_ground']:
-                    result += f"- Status: On Ground\n"
+        if has_spd[i]:
+            append(f"- Speed: {spd_kt[i]:.0f} knots\n")
 
-                result += "\n"
+        if aircraft.on_ground:
+            append(f"- Status: On Ground\n")
 
-            if len(states) > 50:
-                result += f"*Showing 50 of {len(states)} aircraft. Refine your bounding box for fewer results.*\n"
+        append("\n")
 
-            return [types.TextContent(type="text", text=result)]
+    if len(states) > 50:
+        parts.append(f"*Showing 50 of {len(states)} aircraft. Refine your bounding box for fewer results.*\n")
 
-    elif name == "get_aircraft_by_callsign":
-        callsign = arguments.get("callsign", "").strip().upper()
+    return [types.TextContent(type="text", text="".join(parts))]
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{OPENSKY_API_BASE}/states/all"
+@with_error_handling
+async def _tool_aircraft_by_callsign(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_aircraft_by_callsign (single callsign or a batch)."""
+    requested = args.get("callsigns") or [args.get("callsign", "")]
+    requested = [c.strip().upper() for c in requested if c and c.strip()]
 
-            data = await fetch_json(session, url)
+    if not requested:
+        return [types.TextContent(
+            type="text",
+            text="Error: provide 'callsign' or a non-empty 'callsigns' list"
+        )]
 
-            if "error" in data:
-                return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+    url = f"{OPENSKY_API_BASE}/states/all"
 
-            states = data.get("states", [])
+    data = await cached_fetch_json(session, url)
 
-            # Filter by callsign
-            matching = [s for s in states if s[1] and s[1].strip().upper() == callsign]
+    if "error" in data:
+        return [types.TextContent(type="text", text=f"Error: {data['error']}")]
 
-            if not matching:
-                return [types.TextContent(
-                    type="text",
-                    text=f"No aircraft found with callsign: {callsign}\n\n"
-                         f"*Note: Callsign must be exact and aircraft must be airborne.*"
-                )]
+    states = data.get("states", [])
 
-            aircraft = format_aircraft_state(matching[0])
+    if len(requested) > 1:
+        # Batch lookup: frozenset membership is one C-level hash+compare
+        # per row, regardless of how many callsigns were requested
+        targets = frozenset(c.ljust(8) for c in requested)
+        matches = [s for s in states if s[1] in targets]
 
-            result = f"**Aircraft Tracking: {aircraft['callsign']}**\n\n"
-            result += f"**Identification:**\n"
-            result += f"- ICAO24: {aircraft['icao24']}\n"
-            result += f"- Country: {aircraft['origin_country']}\n\n"
+        parts = [f"**Aircraft Tracking** (Matched: {len(matches)} of {len(requested)})\n\n"]
 
-            if aircraft['latitude'] and aircraft['longitude']:
-                result += f"**Position:**\n"
-                result += f"- Latitude: {aircraft['latitude']:.4f}\n"
-                result += f"- Longitude: {aircraft['longitude']:.4f}\n\n"
+        found = set()
+        for s in matches:
+            aircraft = format_aircraft_state(s)
+            found.add(aircraft.callsign)
 
-            result += f"**Altitude & Speed:**\n"
-            if aircraft['baro_altitude']:
-                result += f"- Barometric Altitude: {meters_to_feet(aircraft['baro_altitude']):,.0f} ft\n"
-            if aircraft['geo_altitude']:
-                result += f"- Geometric Altitude: {meters_to_feet(aircraft['geo_altitude']):,.0f} ft\n"
-            if aircraft['velocity']:
-                result += f"- Ground Speed: {mps_to_knots(aircraft['velocity']):.0f} knots\n"
-            if aircraft['vertical_rate']:
-                result += f"- Vertical Rate: {aircraft['vertical_rate'] * 196.85:.0f} ft/min\n"
-            if aircraft['true_track']:
-                result += f"- Heading: {aircraft['true_track']:.0f}°\n\n"
+            parts.append(f"**{aircraft.callsign}** ({aircraft.origin_country})\n")
+            parts.append(f"- ICAO24: {aircraft.icao24}\n")
 
-            result += f"**Status:**\n"
-            result += f"- On Ground: {'Yes' if aircraft['on_ground'] else 'No'}\n"
-            result += f"- Last Contact: {datetime.fromtimestamp(aircraft['last_contact']).strftime('%Y-%m-%d %H:%M:%S UTC')}\n"
+            if aircraft.latitude and aircraft.longitude:
+                parts.append(f"- Position: {aircraft.latitude:.4f}, {aircraft.longitude:.4f}\n")
 
-            if aircraft['squawk']:
-                result += f"- Squawk: {aircraft['squawk']}\n"
+            if aircraft.baro_altitude:
+                parts.append(f"- Altitude: {int(round(meters_to_feet(aircraft.baro_altitude))):,} ft\n")
 
-            return [types.TextContent(type="text", text=result)]
+            if aircraft.velocity:
+                parts.append(f"- Speed: {mps_to_knots(aircraft.velocity):.0f} knots\n")
 
-    elif name == "get_all_aircraft":
-        limit = arguments.get("limit", 50) if arguments else 50
+            parts.append("\n")
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{OPENSKY_API_BASE}/states/all"
+        missing = [c for c in requested if c not in found]
+        if missing:
+            parts.append(f"*No airborne aircraft found for: {', '.join(missing)}*\n")
 
-            data = await fetch_json(session, url)
+        return [types.TextContent(type="text", text="".join(parts))]
 
-            if "error" in data:
-                return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+    callsign = requested[0]
 
-            states = data.get("states", [])
-            total = len(states)
+    # OpenSky reports callsigns uppercase and space-padded to 8 chars,
+    # so comparing against the padded form needs no strip/upper per row.
+    # Stop at the first hit - only one aircraft is displayed anyway.
+    target = callsign.ljust(8)
+    match = next((s for s in states if s[1] == target), None)
+    if match is None:
+        # Fallback for callsigns that don't follow the 8-char padding
+        match = next((s for s in states if s[1] and s[1].rstrip() == callsign), None)
 
-            result = f"**All Aircraft** (Total: {total:,})\n\n"
-            result += f"*Showing first {limit} aircraft*\n\n"
+    if match is None:
+        return [types.TextContent(
+            type="text",
+            text=f"No aircraft found with callsign: {callsign}\n\n"
+                 f"*Note: Callsign must be exact and aircraft must be airborne.*"
+        )]
 
-            for state in states[:limit]:
-                aircraft = format_aircraft_state(state)
+    aircraft = format_aircraft_state(match)
 
-                result += f"**{aircraft['callsign']}** - {aircraft['origin_country']}\n"
+    parts = [f"**Aircraft Tracking: {aircraft.callsign}**\n\n"]
+    parts.append(f"**Identification:**\n")
+    parts.append(f"- ICAO24: {aircraft.icao24}\n")
+    parts.append(f"- Country: {aircraft.origin_country}\n\n")
 
-                if aircraft['latitude'] and aircraft['longitude']:
-                    result += f"  Position: {aircraft['latitude']:.2f}, {aircraft['longitude']:.2f}"
+    if aircraft.latitude and aircraft.longitude:
+        parts.append(f"**Position:**\n")
+        parts.append(f"- Latitude: {aircraft.latitude:.4f}\n")
+        parts.append(f"- Longitude: {aircraft.longitude:.4f}\n\n")
 
-                if aircraft['baro_altitude']:
-                    result += f" | Alt: {meters_to_feet(aircraft['baro_altitude']):,.0f} ft"
+    parts.append(f"**Altitude & Speed:**\n")
+    if aircraft.baro_altitude:
+        parts.append(f"- Barometric Altitude: {int(round(meters_to_feet(aircraft.baro_altitude))):,} ft\n")
+    if aircraft.geo_altitude:
+        parts.append(f"- Geometric Altitude: {int(round(meters_to_feet(aircraft.geo_altitude))):,} ft\n")
+    if aircraft.velocity:
+        parts.append(f"- Ground Speed: {mps_to_knots(aircraft.velocity):.0f} knots\n")
+    if aircraft.vertical_rate:
+        parts.append(f"- Vertical Rate: {aircraft.vertical_rate * 196.85:.0f} ft/min\n")
+    if aircraft.true_track:
+        parts.append(f"- Heading: {aircraft.true_track:.0f}°\n\n")
 
-                result += "\n"
+    parts.append(f"**Status:**\n")
+    parts.append(f"- On Ground: {'Yes' if aircraft.on_ground else 'No'}\n")
+    parts.append(f"- Last Contact: {_fmt_ymdhms(aircraft.last_contact)}\n")
 
-            result += f"\n*Total aircraft tracked worldwide: {total:,}*"
+    if aircraft.squawk:
+        parts.append(f"- Squawk: {aircraft.squawk}\n")
 
-            return [types.TextContent(type="text", text=result)]
+    return [types.TextContent(type="text", text="".join(parts))]
 
-    elif name == "get_arrivals":
-        icao = arguments.get("icao", "").upper()
-        begin = arguments.get("begin")
-        end = arguments.get("end")
+@with_error_handling
+async def _tool_all_aircraft(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_all_aircraft."""
+    limit = args.get("limit", 50) if args else 50
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{OPENSKY_API_BASE}/flights/arrival"
-            params = {
-                "airport": icao,
-                "begin": int(begin),
-                "end": int(end)
-            }
+    url = f"{OPENSKY_API_BASE}/states/all"
 
-            data = await fetch_json(session, url, params)
+    if ijson is not None:
+        # Stream only the rows we display instead of parsing the whole
+        # worldwide payload (15+ MB for a few dozen rendered rows)
+        shown = await _stream_states(session, url, limit)
 
-            if "error" in data:
-                return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+        if isinstance(shown, dict) and "error" in shown:
+            return [types.TextContent(type="text", text=f"Error: {shown['error']}")]
 
-            if isinstance(data, list):
-                flights = data
-            else:
-                flights = []
+        total = None
+    else:
+        data = await cached_fetch_json(session, url)
 
-            if not flights:
-                return [types.TextContent(
-                    type="text",
-                    text=f"No arrivals found for {icao} in time window:\n"
-                         f"- Begin: {datetime.fromtimestamp(begin).strftime('%Y-%m-%d %H:%M UTC')}\n"
-                         f"- End: {datetime.fromtimestamp(end).strftime('%Y-%m-%d %H:%M UTC')}"
-                )]
+        if "error" in data:
+            return [types.TextContent(type="text", text=f"Error: {data['error']}")]
 
-            result = f"**Arrivals: {icao}** (Found: {len(flights)})\n\n"
-            result += f"**Time Window:**\n"
-            result += f"- {datetime.fromtimestamp(begin).strftime('%Y-%m-%d %H:%M UTC')} to "
-            result += f"{datetime.fromtimestamp(end).strftime('%H:%M UTC')}\n\n"
+        states = data.get("states", [])
+        total = len(states)
+        shown = states[:limit]
 
-            for flight in flights[:30]:  # Limit to 30
-                result += f"**{flight.get('callsign', 'N/A').strip()}**\n"
-                result += f"- ICAO24: {flight.get('icao24', 'N/A')}\n"
+    if total is None:
+        parts = [f"**All Aircraft**\n\n"]
+    else:
+        parts = [f"**All Aircraft** (Total: {total:,})\n\n"]
+    parts.append(f"*Showing first {limit} aircraft*\n\n")
+    lon, lat, alt_m, _ = state_numeric_columns(shown).T
+    alt_ft = alt_m * 3.28084
+    has_pos = _present(lat) & _present(lon)
+    has_alt = _present(alt_ft)
 
-                if flight.get('estDepartureAirport'):
-                    result += f"- From: {flight['estDepartureAirport']}\n"
+    append = parts.append
+    for i, state in enumerate(shown):
+        aircraft = format_aircraft_state(state)
 
-                if flight.get('firstSeen'):
-                    result += f"- First Seen: {datetime.fromtimestamp(flight['firstSeen']).strftime('%H:%M UTC')}\n"
+        append(f"**{aircraft.callsign}** - {aircraft.origin_country}\n")
 
-                if flight.get('lastSeen'):
-                    result += f"- Last Seen: {datetime.fromtimestamp(flight['lastSeen']).strftime('%H:%M UTC')}\n"
+        if has_pos[i]:
+            append(f"  Position: {lat[i]:.2f}, {lon[i]:.2f}")
 
-                result += "\n"
+        if has_alt[i]:
+            append(f" | Alt: {int(round(alt_ft[i])):,} ft")
 
-            if len(flights) > 30:
-                result += f"*Showing 30 of {len(flights)} flights*\n"
+        append("\n")
 
-            return [types.TextContent(type="text", text=result)]
+    if total is not None:
+        parts.append(f"\n*Total aircraft tracked worldwide: {total:,}*")
 
-    elif name == "get_departures":
-        icao = arguments.get("icao", "").upper()
-        begin = arguments.get("begin")
-        end = arguments.get("end")
+    return [types.TextContent(type="text", text="".join(parts))]
 
-        async with aiohttp.ClientSession() as session:
-            url = f"{OPENSKY_API_BASE}/flights/departure"
-            params = {
-                "airport": icao,
-                "begin": int(begin),
-                "end": int(end)
-            }
+@with_error_handling
+async def _tool_arrivals(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_arrivals."""
+    icao = args.get("icao", "").upper()
+    begin = args.get("begin")
+    end = args.get("end")
 
-            data = await fetch_json(session, url, params)
+    data = await _fetch_flights(session, "arrival", icao, begin, end)
 
-            if "error" in data:
-                return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+    if isinstance(data, dict) and "error" in data:
+        return [types.TextContent(type="text", text=f"Error: {data['error']}")]
 
-            if isinstance(data, list):
-                flights = data
-            else:
-                flights = []
+    if isinstance(data, list):
+        flights = data
+    else:
+        flights = []
+
+    if not flights:
+        return [types.TextContent(
+            type="text",
+            text=f"No arrivals found for {icao} in time window:\n"
+                 f"- Begin: {_fmt_ymdhm(begin)}\n"
+                 f"- End: {_fmt_ymdhm(end)}"
+        )]
 
-            if not flights:
-                return [types.TextContent(
-                    type="text",
-                    text=f"No departures found for {icao} in time window:\n"
-                         f"- Begin: {datetime.fromtimestamp(begin).strftime('%Y-%m-%d %H:%M UTC')}\n"
-                         f"- End: {datetime.fromtimestamp(end).strftime('%Y-%m-%d %H:%M UTC')}"
-                )]
+    parts = [f"**Arrivals: {icao}** (Found: {len(flights)})\n\n"]
+    _append_time_window(parts, begin, end)
+    _append_flight_lines(parts, flights, 'estDepartureAirport', 'From')
 
-            result = f"**Departures: {icao}** (Found: {len(flights)})\n\n"
-            result += f"**Time Window:**\n"
-            result += f"- {datetime.fromtimestamp(begin).strftime('%Y-%m-%d %H:%M UTC')} to "
-            result += f"{datetime.fromtimestamp(end).strftime('%H:%M UTC')}\n\n"
+    return [types.TextContent(type="text", text="".join(parts))]
 
-            for flight in flights[:30]:  # Limit to 30
-                result += f"**{flight.get('callsign', 'N/A').strip()}**\n"
-                result += f"- ICAO24: {flight.get('icao24', 'N/A')}\n"
+@with_error_handling
+async def _tool_departures(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_departures."""
+    icao = args.get("icao", "").upper()
+    begin = args.get("begin")
+    end = args.get("end")
 
-                if flight.get('estArrivalAirport'):
-                    result += f"- To: {flight['estArrivalAirport']}\n"
+    data = await _fetch_flights(session, "departure", icao, begin, end)
 
-                if flight.get('firstSeen'):
-                    result += f"- First Seen: {datetime.fromtimestamp(flight['firstSeen']).strftime('%H:%M UTC')}\n"
+    if isinstance(data, dict) and "error" in data:
+        return [types.TextContent(type="text", text=f"Error: {data['error']}")]
 
-                if flight.get('lastSeen'):
-                    result += f"- Last Seen: {datetime.fromtimestamp(flight['lastSeen']).strftime('%H:%M UTC')}\n"
+    if isinstance(data, list):
+        flights = data
+    else:
+        flights = []
+
+    if not flights:
+        return [types.TextContent(
+            type="text",
+            text=f"No departures found for {icao} in time window:\n"
+                 f"- Begin: {_fmt_ymdhm(begin)}\n"
+                 f"- End: {_fmt_ymdhm(end)}"
+        )]
+
+    parts = [f"**Departures: {icao}** (Found: {len(flights)})\n\n"]
+    _append_time_window(parts, begin, end)
+    _append_flight_lines(parts, flights, 'estArrivalAirport', 'To')
+
+    return [types.TextContent(type="text", text="".join(parts))]
+
+@with_error_handling
+async def _tool_airport_activity(session: httpx.AsyncClient, args: Dict) -> list[types.TextContent]:
+    """Handle get_airport_activity."""
+    icao = args.get("icao", "").upper()
+    begin = args.get("begin")
+    end = args.get("end")
+
+    # One round trip of wall time instead of two: both requests run
+    # concurrently over the shared keep-alive pool
+    arrivals, departures = await asyncio.gather(
+        _fetch_flights(session, "arrival", icao, begin, end),
+        _fetch_flights(session, "departure", icao, begin, end),
+    )
+
+    for data in (arrivals, departures):
+        if isinstance(data, dict) and "error" in data:
+            return [types.TextContent(type="text", text=f"Error: {data['error']}")]
+
+    arrivals = arrivals if isinstance(arrivals, list) else []
+    departures = departures if isinstance(departures, list) else []
+
+    parts = [f"**Airport Activity: {icao}**\n\n"]
+    _append_time_window(parts, begin, end)
+
+    parts.append(f"**Arrivals** (Found: {len(arrivals)})\n\n")
+    if arrivals:
+        _append_flight_lines(parts, arrivals, 'estDepartureAirport', 'From')
+    else:
+        parts.append("*No arrivals in this window*\n\n")
 
-                result += "\n"
+    parts.append(f"**Departures** (Found: {len(departures)})\n\n")
+    if departures:
+        _append_flight_lines(parts, departures, 'estArrivalAirport', 'To')
+    else:
+        parts.append("*No departures in this window*\n\n")
 
-            if len(flights) > 30:
-                result += f"*Showing 30 of {len(flights)} flights*\n"
+    return [types.TextContent(type="text", text="".join(parts))]
 
-            return [types.TextContent(type="text", text=result)]
+# Dispatch table: tool name -> handler
+TOOLS = {
+    "get_aircraft_in_region": _tool_aircraft_in_region,
+    "get_aircraft_by_callsign": _tool_aircraft_by_callsign,
+    "get_all_aircraft": _tool_all_aircraft,
+    "get_arrivals": _tool_arrivals,
+    "get_departures": _tool_departures,
+    "get_airport_activity": _tool_airport_activity,
+}
 
-    else:
+@server.call_tool()
+async def handle_call_tool(
+    name: str, arguments: dict | None
+) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+    """Handle tool execution via a dict lookup into the dispatch table."""
+    handler = TOOLS.get(name)
+    if handler is None:
         return [types.TextContent(type="text", text=f"Unknown tool: {name}")]
+    return await handler(await get_session(), arguments or {})
 
 async def main():
     """Run the MCP server."""
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="opensky-mcp",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="opensky-mcp",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        if _session is not None and not _session.is_closed:
+            await _session.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())